@@ -1,112 +1,146 @@
-#same setup as visualizations.py
-
+import io
+import sys
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import json
+import duckdb
 from pathlib import Path
-import numpy as np
-
-# Set style
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = (12, 8)
-plt.rcParams['font.size'] = 10
 
 # Paths
 DATA_PATH = Path("data.json")
-OUTPUT_PATH = Path("figures")
-OUTPUT_PATH.mkdir(parents=True, exist_ok=True)
-
-with open(DATA_PATH, 'r') as f:
-    data = json.load(f)
-
-# Convert to DataFrame
-df = pd.DataFrame(data)
-
-# Create commonly used columns
-df['capacity_numeric'] = pd.to_numeric(df['capacity_mw'], errors='coerce')
-df['pop_numeric'] = pd.to_numeric(df['pop_within_mile'], errors='coerce')
-
-# EJ concern: flag if any EJ percentile is >= 80
-ej_cols = [c for c in df.columns if c.startswith('ej_')]
-df['ej_max_percentile'] = df[ej_cols].apply(pd.to_numeric, errors='coerce').max(axis=1)
-df['ej_concern'] = df['ej_max_percentile'] >= 80
 
+# EJ percentile columns (see clean_va_data.py)
+EJ_COLS = [
+    'ej_particulate_matter', 'ej_ozone', 'ej_diesel_pm', 'ej_nitrogen_dioxide',
+    'ej_traffic', 'ej_hazardous_waste', 'ej_superfund', 'ej_rmp', 'ej_ust',
+    'ej_toxic_air', 'ej_wastewater', 'ej_lead_paint', 'ej_drinking_water',
+]
 
-def calculate_exemption_score(row):
-    score = 0
+# Water stress buckets, assigned once per facility in SQL
+WATER_LOW, WATER_MEDIUM, WATER_HIGH, WATER_NONE = range(4)
+
+# Only the fields we score/print. data.json is already typed by clean_va_data.py,
+# so an explicit schema lets DuckDB skip type sniffing and the numeric casts
+JSON_COLUMNS = {
+    'company': 'VARCHAR',
+    'brand': 'VARCHAR',
+    'county': 'VARCHAR',
+    'capacity_mw': 'DOUBLE',
+    'pop_within_mile': 'DOUBLE',
+    'water_stress_index': 'VARCHAR',
+    **{c: 'DOUBLE' for c in EJ_COLS},
+}
+JSON_COLUMNS_SQL = "{" + ", ".join(f"'{c}': '{t}'" for c, t in JSON_COLUMNS.items()) + "}"
+
+# Score every facility in one DuckDB query straight off the JSON file
+SCORE_SQL = f"""
+    WITH facilities AS (
+        SELECT
+            *,
+            capacity_mw AS capacity_numeric,
+            pop_within_mile AS pop_numeric,
+            format('{{:,}}', CAST(trunc(pop_within_mile) AS BIGINT)) AS pop_fmt,
+            -- EJ concern: flag if any EJ percentile is >= 80 (GREATEST skips NULLs)
+            GREATEST({', '.join(EJ_COLS)}) AS ej_max_percentile,
+            CAST(
+                CASE WHEN water_stress_index IN ('Low (<10%)', 'Low - Medium (10-20%)') THEN {WATER_LOW}
+                     WHEN water_stress_index = 'Medium - High (20-40%)' THEN {WATER_MEDIUM}
+                     WHEN water_stress_index IN ('High (40-80%)', 'Extremely High (>80%)') THEN {WATER_HIGH}
+                     ELSE {WATER_NONE}
+                END AS UTINYINT
+            ) AS water_code
+        FROM read_json('{DATA_PATH}', format = 'array', columns = {JSON_COLUMNS_SQL})
+    ),
+
+    scored AS (
+        SELECT
+            *,
+            COALESCE(ej_max_percentile >= 80, FALSE) AS ej_concern,
+
+            -- 1. POWER (28 pts) - based on capacity_mw
+            CASE WHEN capacity_numeric <= 20 THEN 28
+                 WHEN capacity_numeric <= 75 THEN 18
+                 WHEN capacity_numeric <= 200 THEN 7
+                 ELSE 0
+            END AS power_score,
+
+            -- 2. ENVIRONMENTAL JUSTICE (20 pts) - based on max EJ percentile
+            CASE WHEN ej_max_percentile >= 80 THEN 0 ELSE 20 END AS ej_score,
+
+            -- 3. POPULATION (15 pts) - based on pop_within_mile
+            CASE WHEN pop_numeric < 1000 THEN 15
+                 WHEN pop_numeric < 5000 THEN 10
+                 WHEN pop_numeric < 10000 THEN 5
+                 ELSE 0
+            END AS pop_score,
+
+            -- 4. WATER STRESS (12 pts)
+            CASE WHEN water_code = {WATER_LOW} THEN 12
+                 WHEN water_code = {WATER_MEDIUM} THEN 6
+                 ELSE 0
+            END AS water_score
+
+            -- 5-8. REMAINING (25 pts) - renewables, emissions (CO2), community, disclosure
+            -- All 0 due to no data
+        FROM facilities
+    ),
+
+    totals AS (
+        SELECT
+            *,
+            CAST(power_score + ej_score + pop_score + water_score AS BIGINT) AS exemption_score
+        FROM scored
+    )
+
+    SELECT
+        *,
+        CASE WHEN exemption_score >= 80 THEN 'Full Exemption (100%)'
+             WHEN exemption_score >= 60 THEN 'Partial Exemption (50%)'
+             ELSE 'No Exemption (0%)'
+        END AS exemption_tier
+    FROM totals;
+"""
+
+con = duckdb.connect()
+df = con.execute(SCORE_SQL).fetchdf()
+con.close()
+
+
+def failing_criteria(row):
+    """List the reasons a single facility lost points (only built for printed rows)"""
     reasons = []
 
-    # 1. POWER (28 pts) - based on capacity_mw
     cap = row['capacity_numeric']
-    if pd.notna(cap):
-        if cap <= 20:
-            score += 28
-        elif cap <= 75:
-            score += 18
-        elif cap <= 200:
-            score += 7
-        else:
-            score += 0
-            reasons.append(f"High capacity ({cap:.0f} MW)")
-    else:
-        score += 0
+    if pd.isna(cap):
         reasons.append("No capacity data")
+    elif cap > 200:
+        reasons.append(f"High capacity ({cap:.0f} MW)")
 
-    # 2. ENVIRONMENTAL JUSTICE (20 pts) - based on max EJ percentile
-    if not row['ej_concern']:
-        score += 20
-    else:
-        score += 0
+    if row['ej_concern']:
         reasons.append(f"Environmental justice concerns (max percentile: {row['ej_max_percentile']:.0f})")
 
-    # 3. POPULATION (15 pts) - based on pop_within_mile
     pop = row['pop_within_mile']
     if pd.notna(pop):
         pop_num = float(pop)
-        if pop_num < 1000:
-            score += 15
-        elif pop_num < 5000:
-            score += 10
-            reasons.append(f"Population exposure: {pop_num:.0f} residents")
-        elif pop_num < 10000:
-            score += 5
-            reasons.append(f"High population exposure: {pop_num:.0f} residents")
-        else:
-            score += 0
+        if pop_num >= 10000:
             reasons.append(f"Very high population exposure: {pop_num:.0f} residents")
+        elif pop_num >= 5000:
+            reasons.append(f"High population exposure: {pop_num:.0f} residents")
+        elif pop_num >= 1000:
+            reasons.append(f"Population exposure: {pop_num:.0f} residents")
     else:
-        score += 0
         reasons.append("No population data")
 
-    # 4. WATER STRESS (12 pts)
-    water_stress = row['water_stress_index']
-    if water_stress in ['Low (<10%)', 'Low - Medium (10-20%)']:
-        score += 12
-    elif water_stress in ['Medium - High (20-40%)']:
-        score += 6
+    water_code = row['water_code']
+    if water_code == WATER_MEDIUM:
         reasons.append("Medium-high water stress")
-    elif water_stress in ['High (40-80%)', 'Extremely High (>80%)']:
-        score += 0
-        reasons.append(f"High water stress ({water_stress})")
-    else:
-        score += 0
+    elif water_code == WATER_HIGH:
+        reasons.append(f"High water stress ({row['water_stress_index']})")
 
-    # 5-8. REMAINING (25 pts) - renewables, emissions (CO2), community, disclosure
-    # All 0 due to no data
     reasons.append("No renewable energy data (0/10)")
     reasons.append("No CO2 emissions data (0/7)")
     reasons.append("No community engagement data (0/4)")
     reasons.append("No disclosure data (0/4)")
 
-    if score >= 80:
-        tier = "Full Exemption (100%)"
-    elif score >= 60:
-        tier = "Partial Exemption (50%)"
-    else:
-        tier = "No Exemption (0%)"
-
-    return score, tier, reasons
+    return reasons
 
 
 def print_detailed_breakdown(row, idx):
@@ -115,9 +149,11 @@ def print_detailed_breakdown(row, idx):
     facility_name = row.get('brand', row.get('company', 'Unknown Facility'))
     county = row.get('county', 'Unknown County')
 
-    print(f"\n{'='*80}")
-    print(f"FACILITY #{idx}: {facility_name} - {county}")
-    print(f"{'='*80}")
+    out = io.StringIO()
+
+    out.write(f"\n{'='*80}\n")
+    out.write(f"FACILITY #{idx}: {facility_name} - {county}\n")
+    out.write(f"{'='*80}\n")
 
     score_breakdown = {}
     total = 0
@@ -150,26 +186,28 @@ def print_detailed_breakdown(row, idx):
     pop = row['pop_within_mile']
     if pd.notna(pop):
         pop_num = float(pop)
+        pop_fmt = row['pop_fmt']
         if pop_num < 1000:
-            pop_score, pop_detail = 15, f'{int(pop_num):,} residents (<1,000)'
+            pop_score, pop_detail = 15, f'{pop_fmt} residents (<1,000)'
         elif pop_num < 5000:
-            pop_score, pop_detail = 10, f'{int(pop_num):,} residents (1k-5k)'
+            pop_score, pop_detail = 10, f'{pop_fmt} residents (1k-5k)'
         elif pop_num < 10000:
-            pop_score, pop_detail = 5, f'{int(pop_num):,} residents (5k-10k)'
+            pop_score, pop_detail = 5, f'{pop_fmt} residents (5k-10k)'
         else:
-            pop_score, pop_detail = 0, f'{int(pop_num):,} residents (≥10k)'
+            pop_score, pop_detail = 0, f'{pop_fmt} residents (≥10k)'
     else:
         pop_score, pop_detail = 0, 'No data'
     total += pop_score
     score_breakdown['Population'] = (pop_score, 15, pop_detail)
 
     # 4. WATER STRESS (12 pts)
+    water_code = row['water_code']
     water_stress = row['water_stress_index']
-    if water_stress in ['Low (<10%)', 'Low - Medium (10-20%)']:
+    if water_code == WATER_LOW:
         water_score, water_detail = 12, f'Low stress: {water_stress}'
-    elif water_stress in ['Medium - High (20-40%)']:
+    elif water_code == WATER_MEDIUM:
         water_score, water_detail = 6, f'Med-high stress: {water_stress}'
-    elif water_stress in ['High (40-80%)', 'Extremely High (>80%)']:
+    elif water_code == WATER_HIGH:
         water_score, water_detail = 0, f'High/extreme stress: {water_stress}'
     else:
         water_score, water_detail = 0, 'No data'
@@ -183,34 +221,31 @@ def print_detailed_breakdown(row, idx):
     score_breakdown['Disclosure'] = (0, 4, 'No data available')
 
     # Print breakdown
-    print(f"\nFINAL SCORE: {total}/100")
-    print(f"TIER: {row['exemption_tier']}\n")
+    out.write(f"\nFINAL SCORE: {total}/100\n")
+    out.write(f"TIER: {row['exemption_tier']}\n\n")
 
     # Scored categories
-    print(f"SCORED CATEGORIES: {total}/75 pts achievable")
+    out.write(f"SCORED CATEGORIES: {total}/75 pts achievable\n")
     for cat in ['Power', 'Environmental Justice', 'Population', 'Water Stress']:
         s, mx, detail = score_breakdown[cat]
-        print(f"  • {cat}: {s}/{mx} pts — {detail}")
+        out.write(f"  • {cat}: {s}/{mx} pts — {detail}\n")
 
     # Unscored categories
-    print(f"\nUNSCORED CATEGORIES: 0/25 pts (no data)")
+    out.write(f"\nUNSCORED CATEGORIES: 0/25 pts (no data)\n")
     for cat in ['Renewable Energy', 'CO2 Emissions', 'Community Engagement', 'Disclosure']:
         s, mx, detail = score_breakdown[cat]
-        print(f"  • {cat}: {s}/{mx} pts — {detail}")
+        out.write(f"  • {cat}: {s}/{mx} pts — {detail}\n")
 
     # Issues
-    if row['failing_criteria']:
-        print(f"\n KEY ISSUES:")
-        for issue in row['failing_criteria']:
+    issues = failing_criteria(row)
+    if issues:
+        out.write(f"\n KEY ISSUES:\n")
+        for issue in issues:
             if 'No renewable' not in issue and 'No CO2' not in issue and 'No community' not in issue and 'No disclosure' not in issue:
-                print(f"  • {issue}")
+                out.write(f"  • {issue}\n")
 
+    sys.stdout.write(out.getvalue())
 
-# Calculate SCORES
-results = df.apply(calculate_exemption_score, axis=1)
-df['exemption_score'] = results.apply(lambda x: x[0])
-df['exemption_tier'] = results.apply(lambda x: x[1])
-df['failing_criteria'] = results.apply(lambda x: x[2])
 
 # Select 5 diverse examples - mix of high, medium, low scorers
 df_sorted = df.sort_values('exemption_score')
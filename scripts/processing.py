@@ -4,44 +4,35 @@ from pathlib import Path
 DB_PATH = Path("heatgrid.duckdb")
 HEAT_THRESHOLD_C = 32.22
 
-def build_noaa_daily():
-    con = duckdb.connect(str(DB_PATH), read_only=False)
-
-    #daily max and mean temp per station
-    con.execute(f"""DROP TABLE IF EXISTS noaa_daily_temp;
-                """)
-    con.execute(f"""CREATE TABLE noaa_daily_temp AS
-                SELECT 
-                    station,
-                    DATE_TRUNC('day', hour_utc) AS day_utc,
-                    MAX(temp_C) AS daily_max_temp_C,
-                    AVG(temp_C) AS avg_temp_C
-                FROM noaa_hourly_avg
-                GROUP BY station, day_utc
-                ORDER BY station, day_utc;""")
-    print("noaa_daily_temp rows: ", con.execute("SELECT COUNT(*) FROM noaa_daily_temp;").fetchone()[0])
-
-    con.close()
-
-#we now have one row per day perstation
-def build_noaa_heatwave_flags():
-    con = duckdb.connect(str(DB_PATH), read_only=False)
+#daily max/mean temp per station, hot days and heatwaves in one pass over noaa_hourly_avg
+def build_noaa_heatwave_flags(con):
+    con.begin()
 
     con.execute("""
-        DROP TABLE IF EXISTS noaa_heatwave_flags;
+        DROP TABLE IF EXISTS noaa_daily_temp;
     """)
 
-    con.execute("""
-        CREATE TABLE noaa_heatwave_flags AS
-        WITH base AS (
+    con.execute(f"""
+        CREATE OR REPLACE TABLE noaa_heatwave_flags AS
+        WITH daily AS (
+            SELECT
+                station,
+                DATE_TRUNC('day', hour_utc) AS day_utc,
+                MAX(temp_C) AS daily_max_temp_C,
+                AVG(temp_C) AS avg_temp_C
+            FROM noaa_hourly_avg
+            GROUP BY station, day_utc
+        ),
+
+        base AS (
             SELECT
                 station,
                 day_utc,
                 daily_max_temp_C,
                 avg_temp_C,
-                CASE WHEN daily_max_temp_C >= 32.22 THEN 1 ELSE 0 END AS is_hot_day,
+                CASE WHEN daily_max_temp_C >= {HEAT_THRESHOLD_C} THEN 1 ELSE 0 END AS is_hot_day,
                 CAST(day_utc AS DATE) AS day_date
-            FROM noaa_daily_temp
+            FROM daily
         ),
                 
         hot_days AS (
@@ -95,10 +86,12 @@ def build_noaa_heatwave_flags():
         FROM base b
         LEFT JOIN heatwave_days hd
           ON b.station = hd.station
-         AND CAST(b.day_utc AS DATE) = hd.day_date
+         AND b.day_date = hd.day_date
         ORDER BY b.station, b.day_utc;
     """)
 
+    con.commit()
+
     print("noaa_heatwave_flags rows:",
           con.execute("SELECT COUNT(*) FROM noaa_heatwave_flags;").fetchone()[0])
 
@@ -110,17 +103,11 @@ def build_noaa_heatwave_flags():
         ORDER BY station, is_hot_day, is_heatwave_day;
     """).fetchall())
 
-    con.close()
-
 #finding the total energy consumption per day and the peak hour of day
-def build_eia_daily_load():
-    con = duckdb.connect(str(DB_PATH), read_only=False)
-
-    con.execute("DROP TABLE IF EXISTS eia_daily_load;")
-
+def build_eia_daily_load(con):
     # FIX: remove any duplicate region/hour rows before aggregating to days
     con.execute("""
-        CREATE TABLE eia_daily_load AS
+        CREATE OR REPLACE TABLE eia_daily_load AS
         WITH hourly_unique AS (
             SELECT DISTINCT
                 region,
@@ -142,15 +129,10 @@ def build_eia_daily_load():
         "eia_daily_load rows:",
         con.execute("SELECT COUNT(*) FROM eia_daily_load;").fetchone()[0]
     )
-    con.close()
-
-def heat_load_daily():
-    con = duckdb.connect(str(DB_PATH), read_only=False)
-
-    con.execute("DROP TABLE IF EXISTS heat_load_daily;")
 
+def heat_load_daily(con):
     con.execute("""
-        CREATE TABLE heat_load_daily AS
+        CREATE OR REPLACE TABLE heat_load_daily AS
         SELECT
             n.station,
             CASE WHEN n.station = 'IAD' THEN 'PJM'
@@ -173,10 +155,12 @@ def heat_load_daily():
     print("heat_load_daily rows:",
           con.execute("SELECT COUNT(*) FROM heat_load_daily;").fetchone()[0])
 
-    con.close()
-
 if __name__ == "__main__":
-    build_noaa_daily()            # daily NOAA temps
-    build_noaa_heatwave_flags()   # hot days + heatwaves
-    build_eia_daily_load()        # daily EIA load
-    heat_load_daily()             # merge weather + load
+    # one connection for every step
+    con = duckdb.connect(str(DB_PATH), read_only=False)
+
+    build_noaa_heatwave_flags(con)   # daily NOAA temps + hot days + heatwaves
+    build_eia_daily_load(con)        # daily EIA load
+    heat_load_daily(con)             # merge weather + load
+
+    con.close()